@@ -1,3 +1,9 @@
+import io
+import string
+from dataclasses import dataclass
+from datetime import datetime
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 import plotly.express as px
@@ -11,6 +17,65 @@ HFT_TRADES_PER_MIN = 5
 ARBITRAGE_SECONDS = 10
 ARBITRAGE_WINRATE = 0.80
 
+# calamine reads xlsx far faster than openpyxl; fall back if unavailable.
+try:
+    import python_calamine  # noqa: F401
+
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# pyarrow tokenizes CSV in parallel; fall back to the C engine if missing.
+try:
+    import pyarrow  # noqa: F401
+
+    CSV_ENGINE = "pyarrow"
+except ImportError:
+    CSV_ENGINE = "c"
+
+# numba compiles the summary reductions into one fused pass when present.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+COL_MAP = {
+    "ticket": "Ticket",
+    "opentime": "Open Time",
+    "closetime": "Close Time",
+    "symbol": "Symbol",
+    "volume": "Volume",
+    "profit": "Profit",
+}
+REQUIRED_COLS = list(COL_MAP.values())
+
+# Band codes from np.digitize over the nested holding-time thresholds:
+# arbitrage ⊂ HFT ⊂ scalping, so one uint8 column encodes all three flags.
+BAND_ARBITRAGE = 0
+BAND_HFT = 1
+BAND_SCALPING = 2
+
+# Columns shown in the trade table, in display order.
+DISPLAY_COLS = (
+    "Ticket",
+    "Symbol",
+    "Volume",
+    "Open Time",
+    "Close Time",
+    "Holding Seconds",
+    "Profit",
+)
+
+# Timestamp layouts seen in MT5 exports, checked in order.
+DATETIME_FORMATS = ("%Y.%m.%d %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y.%m.%d %H:%M")
+
+# A line chart resolves ~2k horizontal pixels; more points than this only
+# inflate the JSON payload and browser render time.
+EQUITY_MAX_POINTS = 2000
+
+# Below this the JIT/thread overhead of the parallel scan outweighs the gain.
+PARALLEL_CUMSUM_MIN_ROWS = 200_000
+
 st.set_page_config(page_title="MT5 Toxic Trading Analyzer", layout="wide")
 st.title("MT5 Toxic Trading Analyzer")
 
@@ -24,22 +89,352 @@ Analyze MT5 trading behavior for:
 # ---------------------------
 # HELPER: FIND REAL HEADER
 # ---------------------------
+# Lowercase and drop spaces in one C-level translate pass instead of
+# chaining strip/lower/replace with their intermediate strings.
+_NORM_TABLE = str.maketrans(
+    {c: c.lower() for c in string.ascii_uppercase}
+    | {c: None for c in " \t\r\n\xa0"}
+)
+
 def normalize_col(col):
-    return str(col).strip().lower().replace(" ", "")
+    return str(col).translate(_NORM_TABLE)
 
 def detect_mt5_table(df_raw):
-    required = ["ticket", "opentime", "closetime", "symbol", "volume", "profit"]
+    required = {"ticket", "opentime", "closetime", "symbol", "volume", "profit"}
+
+    # Normalize every cell in one vectorized pass instead of calling
+    # normalize_col per cell while scanning for the header row.
+    norm = np.char.replace(
+        np.char.lower(np.char.strip(df_raw.to_numpy().astype(str))), " ", ""
+    )
 
-    for i in range(len(df_raw)):
-        row = df_raw.iloc[i].astype(str)
-        norm = [normalize_col(c) for c in row]
-        if all(r in norm for r in required):
+    for i in range(norm.shape[0]):
+        if required <= set(norm[i]):
             df = df_raw.iloc[i + 1 :].copy()
-            df.columns = row
+            df.columns = df_raw.iloc[i].astype(str)
             return df
 
     return None
 
+def _summary_stats(profit, band):
+    """Accumulate all summary reductions in one sweep over the two arrays."""
+    total = 0.0
+    scalp_n = 0
+    scalp_profit = 0.0
+    arb_n = 0
+    arb_wins = 0
+    for i in range(profit.shape[0]):
+        p = profit[i]
+        b = band[i]
+        total += p
+        if b <= BAND_SCALPING:
+            scalp_n += 1
+            scalp_profit += p
+        if b <= BAND_ARBITRAGE:
+            arb_n += 1
+            if p > 0:
+                arb_wins += 1
+    return total, scalp_n, scalp_profit, arb_n, arb_wins
+
+if njit is not None:
+    summary_stats = njit(cache=True)(_summary_stats)
+else:
+    def summary_stats(profit, band):
+        # Vectorized fallback: a few NumPy passes instead of one fused loop.
+        total = float(profit.sum())
+        scalp = band <= BAND_SCALPING
+        scalp_n = int(scalp.sum())
+        scalp_profit = float(profit[scalp].sum())
+        # Masked reduce over the full arrays - no fancy-indexed sub-array
+        # of Profit just to count its positive entries.
+        arb_mask = band <= BAND_ARBITRAGE
+        arb_n = int(arb_mask.sum())
+        arb_wins = int(((profit > 0) & arb_mask).sum())
+        return total, scalp_n, scalp_profit, arb_n, arb_wins
+
+if njit is not None:
+    from numba import get_num_threads, prange
+
+    @njit(parallel=True, cache=True)
+    def _parallel_cumsum(a, nblocks):
+        """Two-pass blocked prefix sum: local scans, then carry fix-up."""
+        n = a.shape[0]
+        out = np.empty(n, dtype=np.float64)
+        block = (n + nblocks - 1) // nblocks
+        sums = np.zeros(nblocks, dtype=np.float64)
+        for b in prange(nblocks):
+            lo = b * block
+            hi = min(lo + block, n)
+            s = 0.0
+            for i in range(lo, hi):
+                s += a[i]
+                out[i] = s
+            sums[b] = s
+        carry = 0.0
+        for b in range(nblocks):
+            tmp = sums[b]
+            sums[b] = carry
+            carry += tmp
+        for b in prange(1, nblocks):
+            off = sums[b]
+            lo = b * block
+            hi = min(lo + block, n)
+            for i in range(lo, hi):
+                out[i] += off
+        return out
+
+def cumulative_profit(a):
+    """Prefix-sum a float64 array, in parallel blocks for large inputs."""
+    if njit is not None and a.shape[0] > PARALLEL_CUMSUM_MIN_ROWS:
+        return _parallel_cumsum(a, get_num_threads())
+    return np.cumsum(a)
+
+def lttb_downsample(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling for line plots.
+
+    Keeps the first and last points and, per bucket, the point forming the
+    largest triangle with the previously kept point and the next bucket's
+    mean, so the visual shape of the line survives the reduction.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    xf = x.view("i8").astype(np.float64) if x.dtype.kind == "M" else np.asarray(x, dtype=np.float64)
+    yf = np.asarray(y, dtype=np.float64)
+
+    # Bucket edges over the interior points; endpoints are always kept.
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+
+    idx = np.empty(n_out, dtype=np.intp)
+    idx[0] = 0
+    idx[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i < n_out - 3:
+            nlo, nhi = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            ax = xf[nlo:nhi].mean()
+            ay = yf[nlo:nhi].mean()
+        else:
+            ax, ay = xf[-1], yf[-1]
+        area = np.abs(
+            (xf[a] - ax) * (yf[lo:hi] - yf[a]) - (xf[a] - xf[lo:hi]) * (ay - yf[a])
+        )
+        a = lo + int(area.argmax())
+        idx[i + 1] = a
+
+    return x[idx], y[idx]
+
+_SECONDS_DIVISOR = {"s": 1, "ms": 1_000, "us": 1_000_000, "ns": 1_000_000_000}
+
+def epoch_seconds(series):
+    """int64 epoch seconds from a datetime column via a zero-copy view.
+
+    The divisor comes from the column's actual resolution (ns on pandas
+    1.x/2.x, us on 3.x) rather than assuming nanoseconds; unexpected
+    units fall back to an explicit datetime64[s] cast.
+    """
+    arr = series.to_numpy()
+    unit, step = np.datetime_data(arr.dtype)
+    divisor = _SECONDS_DIVISOR.get(unit)
+    if divisor is None or step != 1:
+        return series.to_numpy(dtype="datetime64[s]").view("i8")
+    return arr.view("i8") // divisor
+
+def detect_datetime_format(series):
+    """Match the first non-null value against known MT5 timestamp formats."""
+    sample = series.dropna()
+    if len(sample):
+        first = str(sample.iloc[0]).strip()
+        for fmt in DATETIME_FORMATS:
+            try:
+                datetime.strptime(first, fmt)
+            except ValueError:
+                continue
+            return fmt
+    return None
+
+# ---------------------------
+# CACHED LOAD / PROCESS
+# ---------------------------
+@st.cache_data(show_spinner=False)
+def load_trades(file_bytes, is_xlsx):
+    """Parse an uploaded MT5 export once per unique file content."""
+    if is_xlsx:
+        raw = pd.read_excel(io.BytesIO(file_bytes), header=None, engine=EXCEL_ENGINE)
+    else:
+        try:
+            raw = pd.read_csv(io.BytesIO(file_bytes), header=None, engine=CSV_ENGINE)
+        except pd.errors.ParserError:
+            if CSV_ENGINE == "c":
+                raise
+            # pyarrow hard-fails on ragged short rows (e.g. the trailing
+            # Total/summary lines of MT5 reports) that the C engine pads
+            # with NaN; retry with the C parser so those files still load.
+            raw = pd.read_csv(io.BytesIO(file_bytes), header=None, engine="c")
+
+    return detect_mt5_table(raw)
+
+@st.cache_data(show_spinner=False)
+def process_trades(df):
+    """Normalize columns, coerce types and derive the analysis columns."""
+    df = df.copy()
+    df.columns = [normalize_col(c) for c in df.columns]
+    df = df.rename(columns=COL_MAP)
+
+    missing = [c for c in REQUIRED_COLS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}")
+
+    # An explicit format keeps pd.to_datetime on the vectorized C path
+    # instead of per-element dateutil inference; format=None falls back.
+    for col in ("Open Time", "Close Time"):
+        fmt = detect_datetime_format(df[col])
+        df[col] = pd.to_datetime(df[col], format=fmt, errors="coerce", cache=True)
+    df = df.dropna(subset=["Open Time", "Close Time"])
+
+    # Columns already typed numeric by the reader skip the per-element
+    # object-path coercion of pd.to_numeric.
+    for col in ("Profit", "Volume"):
+        if df[col].dtype.kind not in "fiu":
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        df[col] = df[col].fillna(0)
+
+    # int64 second difference on zero-copy views of the datetime arrays:
+    # no timedelta/float intermediates and no datetime64[s] copies.
+    df["Holding Seconds"] = epoch_seconds(df["Close Time"]) - epoch_seconds(
+        df["Open Time"]
+    )
+
+    df["Band"] = np.digitize(
+        df["Holding Seconds"],
+        [ARBITRAGE_SECONDS, HFT_HOLDING_SECONDS, SCALPING_SECONDS],
+        right=True,
+    ).astype("uint8")
+
+    return df
+
+@st.cache_data(show_spinner=False)
+def encode_csv(_df, file_bytes, filters):
+    """Encode a frame to CSV bytes, cached on the upload and filter state.
+
+    The frame itself is excluded from the cache key (leading underscore)
+    so reruns don't pickle-hash the whole filtered frame just to look up
+    the bytes; file_bytes plus the filter flags determine it fully.
+    """
+    if CSV_ENGINE == "pyarrow":
+        # pyarrow's C++ writer goes straight to bytes, skipping the full
+        # Python string intermediate of DataFrame.to_csv.
+        import pyarrow as pa
+        import pyarrow.csv
+
+        buf = io.BytesIO()
+        pa.csv.write_csv(pa.Table.from_pandas(_df, preserve_index=False), buf)
+        return buf.getvalue()
+
+    return _df.to_csv(index=False).encode("utf-8")
+
+# ---------------------------
+# CACHED ANALYSIS
+# ---------------------------
+@dataclass
+class AnalysisResult:
+    """Everything derived from the upload alone, independent of the filters."""
+
+    df: pd.DataFrame
+    total_trades: int
+    total_profit: float
+    scalp_trades: int
+    scalp_profit: float
+    max_trades_per_min: int
+    hft_suspect: bool
+    arb_trades: int
+    arb_wins: int
+    arb_winrate: float
+    toxic_score: float
+    equity_x: np.ndarray
+    equity_y: np.ndarray
+    hist_counts: np.ndarray
+    hist_edges: np.ndarray
+
+@st.cache_data(show_spinner=False)
+def analyze(file_bytes, is_xlsx):
+    """Run the whole filter-independent analysis once per unique upload.
+
+    Checkbox and slider interactions only re-render from the cached
+    result; none of the pandas/NumPy work below runs again.
+    """
+    df = load_trades(file_bytes, is_xlsx)
+    if df is None:
+        return None
+    df = process_trades(df)
+
+    profit = df["Profit"].to_numpy(dtype=np.float64)
+    band = df["Band"].to_numpy()
+
+    total_profit, scalp_n, scalp_profit, arb_n, arb_wins = summary_stats(
+        profit, band
+    )
+    arb_winrate = arb_wins / arb_n if arb_n else None
+
+    # Max trades in any one minute: bincount over int64 minute buckets,
+    # one pass with no groupby hash table or derived datetime column.
+    open_minutes = epoch_seconds(df["Open Time"]) // 60
+    if len(open_minutes):
+        idx = (open_minutes - open_minutes.min()).astype(np.intp)
+        max_trades_per_min = int(np.bincount(idx).max())
+    else:
+        max_trades_per_min = 0
+    hft_suspect = max_trades_per_min >= HFT_TRADES_PER_MIN
+
+    # Equity curve: sort one int64 key and cumsum two arrays rather than
+    # reshuffling the whole frame with DataFrame.sort_values.
+    close_times = df["Close Time"].to_numpy()
+    order = np.argsort(close_times.view("i8"), kind="stable")
+    equity_x = close_times[order]
+    equity_y = cumulative_profit(profit[order])
+
+    # Downsample long curves before they hit Plotly's JSON round-trip.
+    if len(equity_x) > 2 * EQUITY_MAX_POINTS:
+        equity_x, equity_y = lttb_downsample(equity_x, equity_y, EQUITY_MAX_POINTS)
+
+    # Bin server-side so only 50 bar heights cross to the browser instead
+    # of every row for Plotly.js to bin client-side.
+    hist_counts, hist_edges = np.histogram(df["Holding Seconds"].to_numpy(), bins=50)
+
+    # 0-100 severity: how much of the account's behavior matches the
+    # toxic patterns the thresholds describe.
+    scalp_share = scalp_n / len(df) if len(df) else 0.0
+    toxic_score = round(
+        60.0 * scalp_share
+        + (20.0 if hft_suspect else 0.0)
+        + (
+            20.0
+            if arb_winrate is not None and arb_winrate >= ARBITRAGE_WINRATE
+            else 0.0
+        ),
+        1,
+    )
+
+    return AnalysisResult(
+        df=df,
+        total_trades=len(df),
+        total_profit=total_profit,
+        scalp_trades=scalp_n,
+        scalp_profit=scalp_profit,
+        max_trades_per_min=max_trades_per_min,
+        hft_suspect=hft_suspect,
+        arb_trades=arb_n,
+        arb_wins=arb_wins,
+        arb_winrate=arb_winrate,
+        toxic_score=toxic_score,
+        equity_x=equity_x,
+        equity_y=equity_y,
+        hist_counts=hist_counts,
+        hist_edges=hist_edges,
+    )
+
 # ---------------------------
 # FILE UPLOAD
 # ---------------------------
@@ -48,117 +443,139 @@ uploaded_file = st.file_uploader(
     type=["csv", "xlsx"]
 )
 
-df = None
+result = None
 
 if uploaded_file:
-    try:
-        if uploaded_file.name.lower().endswith(".xlsx"):
-            raw = pd.read_excel(uploaded_file, header=None)
-        else:
-            raw = pd.read_csv(uploaded_file, header=None)
+    file_bytes = uploaded_file.getvalue()
+    is_xlsx = uploaded_file.name.lower().endswith(".xlsx")
 
-        df = detect_mt5_table(raw)
+    try:
+        raw = load_trades(file_bytes, is_xlsx)
 
-        if df is None:
+        if raw is None:
             st.error("❌ Could not detect MT5 trade table header.")
             st.stop()
 
+        st.subheader("Detected Trade Table Preview")
+        st.dataframe(raw.head(), use_container_width=True)
+
+        result = analyze(file_bytes, is_xlsx)
+
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
     except Exception as e:
         st.error(f"File read error: {e}")
         st.stop()
 
 # ---------------------------
-# PROCESS DATA
+# RENDER
 # ---------------------------
-if df is not None:
-    st.subheader("Detected Trade Table Preview")
-    st.dataframe(df.head(), use_container_width=True)
-
-    # Normalize column names
-    df.columns = [normalize_col(c) for c in df.columns]
-
-    col_map = {
-        "ticket": "Ticket",
-        "opentime": "Open Time",
-        "closetime": "Close Time",
-        "symbol": "Symbol",
-        "volume": "Volume",
-        "profit": "Profit",
-    }
-
-    df = df.rename(columns=col_map)
-
-    required_cols = list(col_map.values())
-    missing = [c for c in required_cols if c not in df.columns]
-    if missing:
-        st.error(f"Missing required columns: {missing}")
-        st.stop()
-
-    df["Open Time"] = pd.to_datetime(df["Open Time"], errors="coerce")
-    df["Close Time"] = pd.to_datetime(df["Close Time"], errors="coerce")
-    df = df.dropna(subset=["Open Time", "Close Time"])
-
-    df["Profit"] = pd.to_numeric(df["Profit"], errors="coerce").fillna(0)
-    df["Volume"] = pd.to_numeric(df["Volume"], errors="coerce").fillna(0)
-
-    df["Holding Seconds"] = (df["Close Time"] - df["Open Time"]).dt.total_seconds()
-
-    df["Scalping"] = df["Holding Seconds"] <= SCALPING_SECONDS
-    df["HFT"] = df["Holding Seconds"] <= HFT_HOLDING_SECONDS
-    df["Arbitrage"] = df["Holding Seconds"] <= ARBITRAGE_SECONDS
+if result is not None:
+    df = result.df
 
     # ---------------------------
     # METRICS
     # ---------------------------
-    total_trades = len(df)
-    total_profit = df["Profit"].sum()
-
     st.divider()
-    c1, c2, c3 = st.columns(3)
-    c1.metric("Total Trades", total_trades)
-    c2.metric("Total P&L", round(total_profit, 2))
-    c3.metric("Scalping Trades", df["Scalping"].sum())
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Total Trades", result.total_trades)
+    c2.metric("Total P&L", round(result.total_profit, 2))
+    c3.metric("Scalping Trades", result.scalp_trades)
+    c4.metric("Max Trades / Minute", result.max_trades_per_min)
+
+    c5, c6, c7 = st.columns(3)
+    c5.metric("Scalping P&L", round(result.scalp_profit, 2))
+    c6.metric(
+        "Arbitrage Winrate",
+        f"{result.arb_winrate:.0%}" if result.arb_winrate is not None else "—",
+    )
+    c7.metric("Toxic Score", f"{result.toxic_score:g} / 100")
+
+    if result.hft_suspect:
+        st.warning(
+            f"⚠️ HFT suspected: {result.max_trades_per_min} trades opened "
+            f"within one minute (threshold {HFT_TRADES_PER_MIN})."
+        )
+
+    if result.arb_winrate is not None and result.arb_winrate >= ARBITRAGE_WINRATE:
+        st.warning(
+            f"⚠️ Arbitrage suspected: {result.arb_wins}/{result.arb_trades} "
+            f"trades held under {ARBITRAGE_SECONDS}s were profitable "
+            f"(threshold {ARBITRAGE_WINRATE:.0%})."
+        )
 
     # ---------------------------
     # EQUITY CURVE
     # ---------------------------
     st.subheader("Equity Curve")
-    df_sorted = df.sort_values("Close Time")
-    df_sorted["Cumulative P&L"] = df_sorted["Profit"].cumsum()
-
     fig = px.line(
-        df_sorted,
-        x="Close Time",
-        y="Cumulative P&L",
+        x=result.equity_x,
+        y=result.equity_y,
+        labels={"x": "Close Time", "y": "Cumulative P&L"},
         title="Cumulative Profit/Loss"
     )
     st.plotly_chart(fig, use_container_width=True)
 
+    # ---------------------------
+    # HOLDING TIME DISTRIBUTION
+    # ---------------------------
+    st.subheader("Holding Time Distribution")
+    fig_hold = px.bar(
+        x=(result.hist_edges[:-1] + result.hist_edges[1:]) / 2,
+        y=result.hist_counts,
+        labels={"x": "Holding Seconds", "y": "Count"},
+        title="Holding Time Distribution"
+    )
+    st.plotly_chart(fig_hold, use_container_width=True)
+
     # ---------------------------
     # TABLE
     # ---------------------------
     st.subheader("Trade Details")
-    st.dataframe(
-        df[
-            [
-                "Ticket",
-                "Symbol",
-                "Volume",
-                "Open Time",
-                "Close Time",
-                "Holding Seconds",
-                "Profit",
-                "Scalping",
-                "HFT",
-                "Arbitrage",
-            ]
-        ],
-        use_container_width=True
+    band = df["Band"].to_numpy()
+    f1, f2, f3 = st.columns(3)
+    only_scalp = f1.checkbox("Scalping only")
+    only_hft = f2.checkbox("HFT only")
+    only_arb = f3.checkbox("Arbitrage only")
+
+    # Compose one boolean mask from the active filters and slice only the
+    # displayed columns, instead of copying the whole frame per rerun.
+    mask = np.ones(len(df), dtype=bool)
+    if only_scalp:
+        mask &= band <= BAND_SCALPING
+    if only_hft:
+        mask &= band <= BAND_HFT
+    if only_arb:
+        mask &= band <= BAND_ARBITRAGE
+
+    view_band = band[mask]
+    # Expand the packed Band column into the three flags only for display.
+    view_df = df.loc[mask, list(DISPLAY_COLS)].assign(
+        Scalping=view_band <= BAND_SCALPING,
+        HFT=view_band <= BAND_HFT,
+        Arbitrage=view_band <= BAND_ARBITRAGE,
+    )
+
+    # Cap the rows serialized per rerun; the grid virtualizes scrolling,
+    # so shipping the whole frame through Arrow IPC buys nothing.
+    n_rows = st.slider("Rows to display", 100, 50000, 5000, step=100)
+
+    # Narrow the displayed dtypes: the UI shows two decimals anyway and
+    # float32/int32 halve the Arrow payload Streamlit ships per rerun.
+    # Metrics and the CSV download keep the full-precision frame.
+    display_df = view_df.head(n_rows).astype(
+        {"Profit": "float32", "Volume": "float32", "Holding Seconds": "int32"}
+    )
+    st.dataframe(display_df, use_container_width=True)
+    st.caption(
+        f"Showing {len(display_df):,} of {len(view_df):,} rows — "
+        "the CSV download contains all filtered rows."
     )
 
     st.download_button(
         "Download Analyzed Trades (CSV)",
-        df.to_csv(index=False),
+        encode_csv(view_df, file_bytes, (only_scalp, only_hft, only_arb)),
         "mt5_analyzed_trades.csv",
         mime="text/csv"
     )